@@ -1,44 +1,136 @@
 import streamlit as st
-from datetime import date
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+import hashlib
+import io
+import pathlib
+import threading
+import time
+import matplotlib.pyplot as plt
 import pandas as pd # Added for pd.DataFrame() and general data handling
 
 import yfinance as yf
+from yfinance.exceptions import YFPricesMissingError, YFRateLimitError, YFTzMissingError
+from curl_cffi.requests.exceptions import RequestException as CurlRequestException
 from prophet import Prophet
 from prophet.plot import plot_plotly
+from prophet.serialize import model_from_json, model_to_json
 from plotly import graph_objs as go
 import requests
-# import json # json is imported by requests, not strictly needed here unless used directly
+from tsdownsample import LTTBDownsampler
 
 # --- Configuration ---
 START = "2015-01-01"
-TODAY = date.today().strftime("%Y-%m-%d")
+MODEL_CACHE_DIR = pathlib.Path("/tmp/prophet_cache") # Survives Streamlit reruns and app restarts within a container
+DOWNLOAD_ATTEMPTS = 3 # Tries per download, with exponential backoff (1s, 2s) between them
+FAILURE_COOLDOWN = timedelta(minutes=10) # How long a ticker that kept failing is skipped before trying Yahoo again
+# Errors worth retrying: Yahoo rate limits and transport failures (yfinance talks to Yahoo through curl_cffi)
+TRANSIENT_ERRORS = (YFRateLimitError, CurlRequestException, OSError)
+# Errors that put a download on FAILURE_COOLDOWN instead of being cached as "no data". yfinance reports a
+# network failure during its timezone lookup as YFTzMissingError, so that can't be trusted as "invalid ticker".
+COOLDOWN_ERRORS = TRANSIENT_ERRORS + (YFTzMissingError,)
+BATCH_SIZE = 20 # Max symbols per yf.download call when several tickers are entered
+PLOT_POINTS = 1000 # Max points per raw-data trace; a chart can't show more than its pixel width
+SYMBOL_LIST_URLS = (
+    ("https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt", "Symbol"),
+    ("https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt", "ACT Symbol"),
+)
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
 
 # --- Streamlit UI Elements ---
 st.title("Stock Prediction App 📈")
 
-user_input = st.text_input("Type the Stock Ticker (e.g., MSFT, GOOG) or Company Name for prediction").upper()
-n_years = st.slider("Years of prediction:", 1, 4)
+# Inputs live in a form so typing or dragging the slider doesn't re-run the pipeline until "Run" is pressed
+with st.form("inputs"):
+    form_input = st.text_input("Type the Stock Ticker (e.g., MSFT, GOOG) or Company Name for prediction. Separate several tickers with commas.").upper()
+    form_years = st.slider("Years of prediction:", 1, 4)
+    submitted = st.form_submit_button("Run")
+
+# Remember the last submitted inputs so reruns from widgets outside the form keep showing the results
+if submitted:
+    st.session_state["submitted_inputs"] = (form_input, form_years)
+user_input, n_years = st.session_state.get("submitted_inputs", ("", 1))
 period = n_years * 365
 
 
 # --- Functions ---
+def _today():
+    """
+    Today's date as a string, evaluated per call rather than at import so a long-running
+    server doesn't keep using the date it started on. Passed as the download end date,
+    it also rotates the data cache key daily.
+    """
+    return date.today().strftime("%Y-%m-%d")
+
+@st.cache_resource
+def http_session():
+    """
+    Shared HTTP session so repeated Yahoo/NASDAQ requests reuse the pooled TCP/TLS connection.
+    Cached as a resource because module-level objects are rebuilt on every Streamlit rerun.
+    """
+    session = requests.Session()
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+@st.cache_data(show_spinner=False, ttl=3600, max_entries=64)
+def search_ticker(query):
+    """
+    Queries Yahoo Finance's search API and returns the best matching symbol, or None.
+    Cached so repeated lookups for the same query don't hit the network on every rerun.
+    Network and parse errors are raised to the caller (and therefore not cached).
+    """
+    yfinance_search_url = "https://query2.finance.yahoo.com/v1/finance/search"
+    params = {"q": query, "quotes_count": 1, "country": "United States"}
+
+    res = http_session().get(url=yfinance_search_url, params=params, timeout=5)
+    res.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
+    data = res.json()
+
+    if 'quotes' in data and data['quotes'] and data['quotes'][0]['symbol']:
+        return data['quotes'][0]['symbol']
+    return None
+
+@st.cache_data(show_spinner=False, ttl=timedelta(days=1))
+def load_symbols():
+    """
+    Downloads the NASDAQ Trader symbol directories (NASDAQ + NYSE/other listed) once a day
+    and returns a dict of upper-case symbol -> security name.
+    Network and parse errors are raised to the caller (and therefore not cached).
+    """
+    symbols = {}
+    for url, symbol_column in SYMBOL_LIST_URLS:
+        res = http_session().get(url, timeout=5)
+        res.raise_for_status()
+        listing = pd.read_csv(io.StringIO(res.text), sep="|", dtype=str, keep_default_na=False)
+        listing = listing[~listing[symbol_column].str.startswith("File Creation Time")] # Trailing footer row
+        symbols.update(zip(listing[symbol_column].str.upper(), listing["Security Name"]))
+    return symbols
+
+@st.cache_resource(show_spinner=False, ttl=timedelta(minutes=5))
+def known_symbols():
+    """
+    Returns the locally cached symbol directory, or an empty dict if it couldn't be downloaded.
+    The empty result is cached for a few minutes so an unreachable nasdaqtrader.com doesn't
+    cost a timeout on every lookup.
+    """
+    try:
+        return load_symbols()
+    except (requests.exceptions.RequestException, pd.errors.ParserError, KeyError):
+        return {}
+
 def getTicker(company_name_or_ticker):
     """
     Tries to find a stock symbol using Yahoo Finance's search API.
     This is particularly useful if the user enters a company name instead of a ticker.
     """
     st.info(f"Searching for ticker symbol for: {company_name_or_ticker}...")
-    yfinance_search_url = "https://query2.finance.yahoo.com/v1/finance/search"
-    user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
-    params = {"q": company_name_or_ticker, "quotes_count": 1, "country": "United States"}
 
     try:
-        res = requests.get(url=yfinance_search_url, params=params, headers={'User-Agent': user_agent})
-        res.raise_for_status()  # Raise an exception for HTTP errors (4xx or 5xx)
-        data = res.json()
+        company_code = search_ticker(company_name_or_ticker)
         
-        if 'quotes' in data and data['quotes'] and data['quotes'][0]['symbol']:
-            company_code = data['quotes'][0]['symbol']
+        if company_code:
             # Sometimes the search returns the input if it's already a ticker.
             # Or it might return a more "official" ticker.
             if company_code.upper() != company_name_or_ticker.upper():
@@ -62,205 +154,312 @@ def getTicker(company_name_or_ticker):
         st.error(f"An unexpected error occurred in getTicker for '{company_name_or_ticker}': {e}")
         return None
 
-def load_data(ticker_or_name, attempt=0, max_attempts=3, initial_input=None):
+def with_retries(fetch):
     """
-    Loads historical stock data using yfinance.
-    Includes logic to attempt ticker lookup if initial download fails,
-    and prevents infinite recursion.
+    Calls fetch(), retrying TRANSIENT_ERRORS with exponential backoff (1s, 2s, ...).
+    The last error is re-raised after DOWNLOAD_ATTEMPTS tries.
     """
-    if not ticker_or_name:
-        st.error("No ticker or company name provided to load_data.")
-        return pd.DataFrame()
-
-    if initial_input is None: # Store the very first user input to avoid re-looking up a resolved ticker
-        initial_input = ticker_or_name
+    for attempt in range(DOWNLOAD_ATTEMPTS):
+        try:
+            return fetch()
+        except TRANSIENT_ERRORS:
+            if attempt == DOWNLOAD_ATTEMPTS - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+@st.cache_data(show_spinner=False, ttl=timedelta(hours=6), max_entries=64)
+def fetch_history(ticker, start, end):
+    """
+    Downloads daily Open/Close prices for a single ticker with yfinance.
+    Cached on (ticker, start, end) so widget interactions don't re-download ~10 years of data.
+    A ticker with no prices gives a (cached) empty DataFrame; transient errors are retried with
+    backoff, then raised (and therefore not cached), as is YFTzMissingError.
+    """
+    try:
+        # Only Open/Close are used (plot + forecast), so skip dividends/splits and drop the other columns.
+        # Ticker.history is a single-symbol request, so it also avoids yf.download's shared-dict threading.
+        # raise_errors=True so failures aren't swallowed into an empty frame that would be cached as "no data".
+        data = with_retries(lambda: yf.Ticker(ticker).history(
+            start=start, end=end, auto_adjust=True, actions=False, raise_errors=True
+        ))
+    except YFPricesMissingError:
+        return pd.DataFrame() # Delisted ticker, or no data for the period
 
-    if attempt >= max_attempts:
-        st.error(f"Failed to load data for '{initial_input}' after {max_attempts} attempts. Please check the input or try again later.")
+    if data.empty:
         return pd.DataFrame()
+    data = data[["Open", "Close"]]
+    data.index = data.index.tz_localize(None) # Prophet does not accept timezone-aware dates
+    return data.reset_index()
 
-    st.info(f"Attempting to load data for: '{ticker_or_name}' (Attempt {attempt + 1}/{max_attempts})")
-    
-    # Try downloading data directly with the current ticker_or_name
-    data = yf.download(ticker_or_name, start=START, end=TODAY, progress=False) # progress=False to avoid console prints
-    
-    if data.empty:
-        st.warning(f"No data downloaded for '{ticker_or_name}'. This could be an invalid ticker, delisted stock, or no data for the period.")
-        
-        # Only try getTicker if it's not the last attempt and if current ticker_or_name might be a company name
-        # or if it's the first attempt with user_input
-        if attempt < max_attempts -1:
-            # If the current ticker_or_name is the same as the initial_input, it means direct download failed,
-            # so we try to resolve it as a company name.
-            # If it's different, it means a previous getTicker result failed, so don't call getTicker again with it.
-            if ticker_or_name.upper() == initial_input.upper() or attempt == 0 :
-                st.info(f"Trying to find an alternative symbol for '{initial_input}' using lookup...")
-                resolved_symbol = getTicker(initial_input) # Always try to resolve the original input
-                
-                if resolved_symbol and resolved_symbol.upper() != ticker_or_name.upper():
-                    # If a NEW, different symbol is found, try loading data for it
-                    return load_data(resolved_symbol, attempt + 1, max_attempts, initial_input)
-                elif resolved_symbol: 
-                    # If getTicker returns the same symbol that just failed OR a symbol that's already been tried implicitly
-                    st.error(f"Ticker lookup for '{initial_input}' returned '{resolved_symbol}', which has already been tried or yielded no data. Stopping this path.")
-                    return pd.DataFrame()
-                else:
-                    # getTicker failed to find any symbol
-                    st.error(f"Could not resolve '{initial_input}' to a valid symbol after lookup.")
-                    return pd.DataFrame()
-            else:
-                # This path means a resolved symbol (different from initial_input) also failed to load data.
-                st.error(f"Previously resolved symbol '{ticker_or_name}' also failed to load data.")
-                return pd.DataFrame()
-        else:
-            st.error(f"Reached max attempts for '{initial_input}', and no data was found.")
-            return pd.DataFrame()
-    else:
-        data.reset_index(inplace=True)
-        st.success(f"Successfully loaded data for '{ticker_or_name}'.")
-        return data
+@st.cache_resource
+def failed_downloads():
+    """
+    Download key -> time of the last download that failed after all retries.
+    Shared across sessions so a failing ticker isn't retried on every rerun.
+    """
+    return {}
 
-# --- Main Application Logic ---
-if user_input:  # Only proceed if user has entered something
-    try:
-        # Pass user_input as initial_input to load_data
-        stock_data = load_data(user_input, initial_input=user_input)
-
-        if not stock_data.empty:
-            st.subheader(f'Raw data for {user_input}')
-            st.write(stock_data.tail())
-
-            # Plot raw data
-            raw_fig = go.Figure()
-            raw_fig.add_trace(go.Scatter(x=stock_data["Date"], y=stock_data["Open"], name="Stock Open", line_color="dodgerblue"))
-            raw_fig.add_trace(go.Scatter(x=stock_data["Date"], y=stock_data["Close"], name="Stock Close", line_color="tomato", opacity=0.8))
-            raw_fig.layout.update(title_text="Time Series Data", xaxis_rangeslider_visible=True)
-            st.plotly_chart(raw_fig)
-
-            # Forecasting
-            st.subheader("Forecasting")
-            df_train = stock_data[["Date", "Close"]].copy() # Use .copy() to avoid SettingWithCopyWarning
-            df_train = df_train.rename(columns={"Date": "ds", "Close": "y"})
-
-            if len(df_train) < 10:  # Prophet generally needs more than just 2 points for a reasonable fit
-                st.warning(f"Not enough historical data (found {len(df_train)} points) for '{user_input}' to make a reliable forecast. Prophet may struggle.")
-            
-            if len(df_train) >= 2: # Minimum for Prophet to run
-                m = Prophet()
-                with st.spinner('Fitting the forecast model...'):
-                    m.fit(df_train)
-                
-                future = m.make_future_dataframe(periods=period)
-                forecast = m.predict(future)
-
-                st.subheader("Forecast data")
-                st.write(forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail())
-
-                st.subheader("Forecast plot")
-                fig1 = plot_plotly(m, forecast)
-                st.plotly_chart(fig1)
-
-                st.subheader("Forecast components")
-                # plot_components returns a Matplotlib figure
-                fig2 = m.plot_components(forecast)
-                st.pyplot(fig2)
-            else:
-                 st.error(f"Cannot proceed with forecasting for '{user_input}' due to insufficient data (less than 2 data points).")
+def with_cooldown(key, label, fetch, default):
+    """
+    Returns fetch(), or default if it raises one of COOLDOWN_ERRORS (after fetch's own retries).
+    After a persistent failure the key is skipped for FAILURE_COOLDOWN instead of retried every rerun.
+    """
+    failed_at = failed_downloads().get(key)
+    if failed_at and datetime.now() - failed_at < FAILURE_COOLDOWN:
+        st.warning(f"Skipping {label}: Yahoo Finance failed for it recently. Try again in a few minutes.")
+        return default
 
-        else:
-            # load_data function should have already shown specific errors.
-            # This is a fallback message if data is empty after all attempts.
-            st.error(f"Could not load any data for '{user_input}'. Please ensure the ticker/company name is correct and try again.")
+    try:
+        return fetch()
+    except COOLDOWN_ERRORS as e:
+        failed_downloads()[key] = datetime.now()
+        st.warning(f"Yahoo Finance request for {label} failed: {e}")
+        return default
 
-    except ValueError as ve:
-        st.error(f"A ValueError occurred: {ve}")
-        st.error("This might be due to issues with the data format for Prophet or other numerical problems. Please check the input and data.")
-    except Exception as e:
-        st.error(f"An unexpected error occurred in the main application: {e}")
-        st.exception(e) # This will print the full traceback in the Streamlit app for debugging
-else:
-    st.info("Please enter a stock ticker or company name to begin analysis.")
+def download_data(ticker, start, end):
+    """
+    Returns fetch_history's data, or an empty DataFrame if Yahoo keeps failing for this ticker.
+    """
+    return with_cooldown((ticker, start, end), f"'{ticker}'", lambda: fetch_history(ticker, start, end), pd.DataFrame())
 
+@st.cache_resource
+def download_lock():
+    """
+    Serializes yf.download calls across sessions: concurrent calls race on yfinance's
+    module-level results dict (shared._DFS).
+    """
+    return threading.Lock()
 
-# import streamlit as st
-# from  datetime import date
+@st.cache_data(show_spinner=False, ttl=timedelta(hours=6), max_entries=64)
+def fetch_batch(tickers, start, end):
+    """
+    Downloads daily Open/Close prices for several tickers with one yf.download call per
+    BATCH_SIZE symbols, and returns a dict of ticker -> DataFrame shaped like fetch_history's.
+    Tickers with no data are left out of the result (yf.download logs per-ticker failures
+    instead of raising), so callers fetch those individually.
+    """
+    batches = {}
+    for i in range(0, len(tickers), BATCH_SIZE):
+        chunk = tickers[i:i + BATCH_SIZE]
+
+        def download_chunk():
+            # threads=True only parallelizes inside this one call; the lock keeps other calls out of shared._DFS
+            with download_lock():
+                return yf.download(" ".join(chunk), start=start, end=end, group_by="ticker", auto_adjust=True,
+                                   actions=False, threads=True, progress=False)
+
+        data = with_retries(download_chunk)
+        if data.empty:
+            continue
+        downloaded = data.columns.get_level_values(0)
+        for ticker in chunk:
+            if ticker not in downloaded:
+                continue
+            ticker_data = data[ticker][["Open", "Close"]].dropna(how="all")
+            if not ticker_data.empty:
+                batches[ticker] = ticker_data.rename_axis("Date").reset_index()
+    return batches
+
+def download_batch(tickers, start, end):
+    """
+    Returns fetch_batch's data, or an empty dict if Yahoo keeps failing for this batch.
+    """
+    return with_cooldown((tickers, start, end), ", ".join(tickers), lambda: fetch_batch(tickers, start, end), {})
 
-# import yfinance as yf
-# from prophet import Prophet
-# from prophet.plot import plot_plotly
-# from plotly import graph_objs as go
-# import requests
-# import json 
+def load_data(ticker_or_name):
+    """
+    Loads historical stock data using yfinance.
+    Listed symbols are downloaded directly, falling back to a lookup if that comes back empty.
+    Anything else (usually a company name) skips the direct download. Either way the input is
+    resolved at most once via getTicker and the resolved symbol is downloaded once.
+    """
+    if not ticker_or_name:
+        st.error("No ticker or company name provided to load_data.")
+        return pd.DataFrame()
 
+    symbols = known_symbols()
+    tried_symbol = None
+    if not symbols or ticker_or_name.upper() in symbols:
+        st.info(f"Attempting to load data for: '{ticker_or_name}'")
+        
+        # Try downloading data directly with the user's input
+        data = download_data(ticker_or_name, START, _today())
+        if not data.empty:
+            st.success(f"Successfully loaded data for '{ticker_or_name}'.")
+            return data
 
-# START = "2015-01-01"
-# TODAY = date.today().strftime("%Y-%m-%d")
+        st.warning(f"No data downloaded for '{ticker_or_name}'. This could be an invalid ticker, delisted stock, or no data for the period.")
+        # Still look it up: the directory uses ACT/CQS notation (e.g. BRK.B), which Yahoo spells differently (BRK-B)
+        tried_symbol = ticker_or_name
+        st.info(f"Trying to find an alternative symbol for '{ticker_or_name}' using lookup...")
+    else:
+        # Not a listed NASDAQ/NYSE symbol, most likely a company name: skip the doomed direct download
+        st.info(f"'{ticker_or_name}' is not a listed symbol, looking it up...")
 
-# st.title("Stock Prediction App 📈 ")
+    resolved_symbol = getTicker(ticker_or_name)
 
-# user_input = st.text_input("Type the Stock Ticker for prediction").upper()
+    if not resolved_symbol:
+        st.error(f"Could not resolve '{ticker_or_name}' to a valid symbol after lookup.")
+        return pd.DataFrame()
 
-# n_years = st.slider("Years of prediction:",1,4)
-# period = n_years * 365
+    if tried_symbol and resolved_symbol.upper() == tried_symbol.upper():
+        st.error(f"Ticker lookup for '{ticker_or_name}' returned '{resolved_symbol}', which has already been tried and yielded no data.")
+        return pd.DataFrame()
 
-# def getTicker(company_name):
-#     yfinance = "https://query2.finance.yahoo.com/v1/finance/search"
-#     user_agent = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36'
-#     params = {"q": company_name, "quotes_count": 1, "country": "United States"}
+    st.info(f"Attempting to load data for: '{resolved_symbol}'")
+    data = download_data(resolved_symbol, START, _today())
+    if data.empty:
+        st.error(f"Resolved symbol '{resolved_symbol}' also failed to load data.")
+        return pd.DataFrame()
 
-#     res = requests.get(url=yfinance, params=params, headers={'User-Agent': user_agent})
-#     data = res.json()
+    st.success(f"Successfully loaded data for '{resolved_symbol}'.")
+    return data
 
-#     company_code = data['quotes'][0]['symbol']
-#     return company_code
+@st.cache_resource(show_spinner=False, max_entries=8)
+def fit_prophet(ticker, n_rows, last_date, _df_train):
+    """
+    Fits a Prophet model on the training frame.
+    Cached on (ticker, n_rows, last_date) so moving the prediction slider only re-runs predict.
+    The leading underscore keeps Streamlit from hashing the whole DataFrame.
+    Fitted models are also written to MODEL_CACHE_DIR so a cold start can skip the fit.
+    """
+    key = hashlib.sha1(f"{ticker}:{last_date}:{n_rows}".encode()).hexdigest()
+    path = MODEL_CACHE_DIR / f"{key}.json"
+    if path.exists():
+        try:
+            return model_from_json(path.read_text())
+        except (OSError, ValueError, KeyError):
+            pass # Corrupt or incompatible cache entry, refit below
+
+    # 100 simulated trajectories (default 1000) is plenty for the interval bands and makes predict ~10x cheaper
+    m = Prophet(uncertainty_samples=100)
+    m.fit(_df_train)
 
+    try:
+        MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path.write_text(model_to_json(m))
+    except OSError:
+        pass # The disk cache is best-effort; the in-memory cache still holds the model
+    return m
 
-# def load_data(ticker):
-#     data = yf.download(ticker, START, TODAY)
-#     if data.empty:
-#         symbol = getTicker(ticker.upper())
-#         st.write(f"ticker is {symbol}")
-#         return load_data(symbol)
-#     else:
-#         data.reset_index(inplace=True)
-#         return data
-    
-# try:
-#     data = load_data(user_input)
+def downsample_for_plot(data, n_out=PLOT_POINTS):
+    """
+    Picks ~n_out representative rows with LTTB (Largest-Triangle-Three-Buckets) on the Close series,
+    preserving the visual shape while shrinking what gets serialized to the browser.
+    Only used for plotting; the forecast still trains on the full data.
+    """
+    if len(data) <= n_out:
+        return data
+    idx = LTTBDownsampler().downsample(
+        data["Date"].values.astype("int64"), data["Close"].values.astype("float64"), n_out=n_out
+    )
+    return data.iloc[idx]
 
-#     st.subheader('Raw data')
-#     st.write(data.tail())
+@st.cache_resource
+def fit_executor():
+    """
+    Shared worker pool for Prophet fits. Threads are enough here: cmdstanpy runs the Stan
+    optimizer as a separate CmdStan process, so the GIL isn't held during the expensive part.
+    """
+    return ThreadPoolExecutor(max_workers=2)
 
-#     def plot_raw_data():
-#         fig = go.Figure()
-#         fig.add_trace(go.Scatter(x=data["Date"],y=data["Open"],name="Stock Open",line_color="light blue"))
-#         fig.add_trace(go.Scatter(x=data["Date"],y=data["Close"],name="Stock Close",line_color="red",opacity=0.5))
-#         fig.layout.update(title_text="Time Series Data",xaxis_rangeslider_visible=True)
-#         st.plotly_chart(fig)
+def fit_in_worker(ctx, *args):
+    """
+    Runs fit_prophet on a fit_executor thread. The pool threads are reused across sessions, so the
+    submitting script's ScriptRunContext is attached per task; Streamlit's cache looks it up on every hit.
+    """
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return fit_prophet(*args)
 
-#     plot_raw_data()
+# --- Main Application Logic ---
+def show_forecast(label, stock_data):
+    """
+    Renders the raw data, forecast and components for one ticker's downloaded data.
+    """
+    # Build Prophet's ds/y frame straight from the column arrays (no intermediate copy + rename)
+    df_train = pd.DataFrame({"ds": stock_data["Date"].values, "y": stock_data["Close"].values})
+
+    # Start the fit in the background (min 2 points for Prophet to run) so it overlaps with drawing the raw data
+    fit_future = None
+    if len(df_train) >= 2:
+        fit_future = fit_executor().submit(
+            fit_in_worker, get_script_run_ctx(), label, len(df_train), df_train["ds"].iloc[-1], df_train
+        )
+
+    st.subheader(f'Raw data for {label}')
+    st.write(stock_data.tail())
+
+    # Plot raw data
+    plot_data = downsample_for_plot(stock_data)
+    raw_fig = go.Figure()
+    raw_fig.add_trace(go.Scatter(x=plot_data["Date"], y=plot_data["Open"], name="Stock Open", line_color="dodgerblue"))
+    raw_fig.add_trace(go.Scatter(x=plot_data["Date"], y=plot_data["Close"], name="Stock Close", line_color="tomato", opacity=0.8))
+    raw_fig.layout.update(title_text="Time Series Data", xaxis_rangeslider_visible=True)
+    st.plotly_chart(raw_fig)
+
+    # Forecasting
+    st.subheader("Forecasting")
+
+    if len(df_train) < 10:  # Prophet generally needs more than just 2 points for a reasonable fit
+        st.warning(f"Not enough historical data (found {len(df_train)} points) for '{label}' to make a reliable forecast. Prophet may struggle.")
+    
+    if fit_future is None:
+        st.error(f"Cannot proceed with forecasting for '{label}' due to insufficient data (less than 2 data points).")
+        return
 
-#     #Forecasting
-#     df_train = data[["Date","Close"]]
-#     df_train = df_train.rename(columns={"Date":"ds", "Close":"y"})
+    with st.spinner('Fitting the forecast model...'):
+        m = fit_future.result()
+    
+    future = m.make_future_dataframe(periods=period)
+    forecast = m.predict(future)
 
-#     m = Prophet()
-#     m.fit(df_train)
-#     future = m.make_future_dataframe(periods=period)
-#     forecast = m.predict(future)
+    st.subheader("Forecast data")
+    # Only the prediction columns are shown; st.dataframe sends them as Arrow directly
+    st.dataframe(forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].tail(), use_container_width=True)
 
-#     st.subheader("Forecast data")
-#     st.write(forecast.tail())
+    st.subheader("Forecast plot")
+    fig1 = plot_plotly(m, forecast)
+    st.plotly_chart(fig1)
 
-#     st.write("forcast data")
-#     fig1 = plot_plotly(m,forecast)
-#     st.plotly_chart(fig1)
+    # plot_components draws several Matplotlib subplots, so only render it on request
+    with st.expander("Forecast components (slow)"):
+        if st.checkbox("Render components", key=f"render_components_{label}"):
+            fig2 = m.plot_components(forecast)
+            st.pyplot(fig2, clear_figure=True)
+            plt.close(fig2) # Drop pyplot's reference so figures don't pile up across reruns
 
-#     st.write("forecast components")
-#     fig2 = m.plot_components(forecast)
-#     st.write(fig2)
+if user_input:  # Only proceed if user has entered something
+    try:
+        # Several comma-separated listed symbols are fetched together; anything else (a company name,
+        # an unlisted symbol or a single entry) goes through load_data's per-ticker lookup
+        tickers = list(dict.fromkeys(t.strip() for t in user_input.split(",") if t.strip()))
+        symbols = known_symbols()
+        listed = tuple(t for t in tickers if t in symbols)
+        if len(listed) > 1:
+            batches = download_batch(listed, START, _today())
+        else:
+            batches = {}
 
+        for ticker in tickers:
+            stock_data = batches.get(ticker)
+            if stock_data is None:
+                # Not batched, or missing from the batch: fall back to the per-ticker lookup
+                stock_data = load_data(ticker)
 
-# except ValueError:
-#     pass
+            if not stock_data.empty:
+                show_forecast(ticker, stock_data)
+            else:
+                # load_data function should have already shown specific errors.
+                # This is a fallback message if data is empty after all attempts.
+                st.error(f"Could not load any data for '{ticker}'. Please ensure the ticker/company name is correct and try again.")
 
+    except ValueError as ve:
+        st.error(f"A ValueError occurred: {ve}")
+        st.error("This might be due to issues with the data format for Prophet or other numerical problems. Please check the input and data.")
+    except Exception as e:
+        st.error(f"An unexpected error occurred in the main application: {e}")
+        st.exception(e) # This will print the full traceback in the Streamlit app for debugging
+    finally:
+        plt.close('all') # Also release any figure left open on an error path
+else:
+    st.info("Please enter a stock ticker or company name and press Run to begin analysis.")